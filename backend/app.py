@@ -1,14 +1,82 @@
 """FastAPI inbound adapter for the Comic Engine API."""
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+import logging
+import os
+from contextlib import asynccontextmanager
+
+import anyio
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from comic_engine.adapters.remote import RemoteDepthModel, inference_authkey
+from comic_engine.core.batching import BatchScheduler
+from comic_engine.core.cache import LRUCache, content_hasher
+from comic_engine.core.image_utils import (
+    DEPTH_FORMATS,
+    MAX_BYTES,
+    ImageTooLargeError,
+    decode_upload,
+    encode_depth_uint8,
+)
+
+logger = logging.getLogger(__name__)
+
+# With DEPTH_INFERENCE_SOCKET set, the model lives in inference_worker.py and
+# any number of uvicorn workers share it; otherwise it is loaded in-process.
+_inference_socket = os.environ.get("DEPTH_INFERENCE_SOCKET")
+if _inference_socket:
+    _model = RemoteDepthModel(_inference_socket, inference_authkey())
+else:
+    # Imported here so API workers in front of a remote model skip torch
+    from comic_engine.adapters.depth_anything import DepthAnythingV2Adapter
+
+    _model = DepthAnythingV2Adapter()
+_scheduler = BatchScheduler(_model.predict_batch_uint8, max_batch=8, max_delay_ms=10)
+_model_ready = False
+# Encoded responses keyed by the content hash of the uploaded bytes. Bounded
+# by bytes too: a 4096x4096 depth map can encode to ~9 MB.
+_cache = LRUCache(maxsize=256, max_bytes=256 * 1024 * 1024)
+
+
+# Seconds between warm-up attempts, e.g. while an inference worker starts
+_WARM_UP_RETRY_S = 5.0
+
+
+async def _warm_up():
+    """Load weights and run one dummy forward so kernels are initialised.
 
-from comic_engine.adapters.depth_anything import DepthAnythingV2Adapter
-from comic_engine.core.depth import estimate_depth
-from comic_engine.core.image_utils import decode_upload, depth_to_png
+    Retries until it succeeds, so /api/health recovers once a slow or
+    restarted inference worker comes up.
+    """
+    global _model_ready
+    dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+    while True:
+        try:
+            await anyio.to_thread.run_sync(_model.predict, dummy)
+        except Exception:
+            logger.exception("Model warm-up failed; retrying")
+            await anyio.sleep(_WARM_UP_RETRY_S)
+            continue
+        _model_ready = True
+        logger.info("Model warm-up complete")
+        return
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /api/health can report readiness meanwhile
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_warm_up)
+        yield
+        tg.cancel_scope.cancel()
+
+
+app = FastAPI(title="Comic Engine API", lifespan=lifespan)
 
-app = FastAPI(title="Comic Engine API")
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,30 +85,196 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-_model = DepthAnythingV2Adapter()
-
 
 @app.get("/api/health")
 async def health():
+    if not _model_ready:
+        return JSONResponse(status_code=503, content={"status": "loading"})
     return {"status": "ok"}
 
 
-@app.post("/api/depth")
-async def depth(file: UploadFile = File(...)):
-    raw = await file.read()
+def _etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if if_none_match is None:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class _FieldReader:
+    """Collects one multipart field into memory while the body streams in."""
+
+    def __init__(self, boundary: bytes, name: str):
+        self.data = bytearray()
+        self.hasher = content_hasher()
+        self.found = False
+        self._name = name.encode()
+        self._capturing = False
+        self._header_name = bytearray()
+        self._header_value = bytearray()
+        self.parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_part_data": self._on_part_data,
+            },
+        )
+
+    def _on_part_begin(self):
+        self._capturing = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition" and not self.found:
+            _, params = parse_options_header(bytes(self._header_value))
+            if params.get(b"name") == self._name:
+                self._capturing = self.found = True
+        self._header_name.clear()
+        self._header_value.clear()
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._capturing:
+            chunk = data[start:end]
+            self.data += chunk
+            self.hasher.update(chunk)
+            if len(self.data) > MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Upload too large")
+
+
+async def _read_upload(
+    request: Request, name: str = "file"
+) -> tuple[bytearray, str]:
+    """Return the bytes of multipart field ``name`` and their content hash.
+
+    Parses the body as it arrives instead of going through ``UploadFile``,
+    which spools to a temporary file and is then copied out again. The hash
+    is computed chunk by chunk, and an upload that crosses ``MAX_BYTES`` is
+    rejected without reading the rest of it (or, given a Content-Length,
+    without reading any of it).
+    """
+    length = request.headers.get("content-length", "")
+    # Allow for the multipart boundaries and part headers around the file
+    if length.isdigit() and int(length) > MAX_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+    reader = _FieldReader(boundary, name)
     try:
-        image = decode_upload(raw)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        async for chunk in request.stream():
+            reader.parser.write(chunk)
+        reader.parser.finalize()
+    except MultipartParseError:
+        raise HTTPException(status_code=400, detail="Invalid multipart data")
+    if not reader.found:
+        raise HTTPException(status_code=422, detail=f"Missing form field '{name}'")
+    return reader.data, reader.hasher.hexdigest()
+
+
+# The body is parsed by hand (see _read_upload), so describe it for OpenAPI
+_UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+_MEDIA_TYPES = {media_type: fmt for fmt, (media_type, _) in DEPTH_FORMATS.items()}
+# Among types the client weights equally, prefer the smallest responses
+_FORMAT_PREFERENCE = ("webp", "avif", "png")
+
+
+def _negotiate_format(accept: str | None) -> str:
+    """Pick a ``DEPTH_FORMATS`` key from an Accept header.
+
+    Only formats the client names explicitly count, so ``*/*`` (what
+    ``fetch`` sends by default) keeps the lossless PNG.
+    """
+    best, best_rank = "png", (0.0, 0)
+    for entry in (accept or "").split(","):
+        media_type, params = parse_options_header(entry)
+        fmt = _MEDIA_TYPES.get(media_type.decode("latin-1"))
+        if fmt is None:
+            continue
+        try:
+            q = float(params.get(b"q", b"1"))
+        except ValueError:
+            continue
+        rank = (q, -_FORMAT_PREFERENCE.index(fmt))
+        if q > 0 and rank > best_rank:
+            best, best_rank = fmt, rank
+    return best
+
+
+@app.post("/api/depth", openapi_extra=_UPLOAD_SCHEMA)
+async def depth(
+    request: Request,
+    fmt: str | None = Query(default=None, alias="format"),
+    accept: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    # ?format= overrides content negotiation
+    if fmt is None:
+        fmt = _negotiate_format(accept)
+    elif fmt not in DEPTH_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format; choose from {', '.join(DEPTH_FORMATS)}",
+        )
+    media_type = DEPTH_FORMATS[fmt][0]
+
+    # The depth of byte-identical uploads cannot change, so the content
+    # hash (plus the format) doubles as the cache key and the ETag.
+    raw, digest = await _read_upload(request)
+    key = f"{digest}.{fmt}"
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Vary": "Accept"}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    cached = _cache.get(key)
+    if cached is None:
+        # Decoding and encoding run in worker threads (PIL releases the GIL)
+        # so they do not block the event loop for other requests.
+        try:
+            image = await anyio.to_thread.run_sync(decode_upload, raw)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    depth_map = estimate_depth(image, _model)
-    png_bytes = depth_to_png(depth_map)
+        # Concurrent requests share one batched forward pass
+        depth_map = await _scheduler.submit(image)
+        encoded = await anyio.to_thread.run_sync(encode_depth_uint8, depth_map, fmt)
+        cached = (encoded, depth_map.shape[1], depth_map.shape[0])
+        _cache.put(key, cached, size=len(encoded))
 
+    encoded, width, height = cached
     return Response(
-        content=png_bytes,
-        media_type="image/png",
+        content=encoded,
+        media_type=media_type,
         headers={
-            "X-Depth-Width": str(depth_map.shape[1]),
-            "X-Depth-Height": str(depth_map.shape[0]),
+            **headers,
+            "X-Depth-Width": str(width),
+            "X-Depth-Height": str(height),
         },
     )
@@ -2,12 +2,17 @@
 
 from __future__ import annotations
 
+import contextlib
+import functools
 import logging
+import math
 import os
+import threading
 
 import numpy as np
 import torch
-from PIL import Image
+import torch.nn.functional as F
+from torchvision.transforms import v2
 from transformers import AutoImageProcessor, AutoModelForDepthEstimation
 
 logger = logging.getLogger(__name__)
@@ -17,13 +22,25 @@ class DepthAnythingV2Adapter:
     """Outbound adapter: HuggingFace Depth Anything V2 model."""
 
     MODEL_ID = "depth-anything/Depth-Anything-V2-Small-hf"
+    INTERP_MODES = ("bilinear", "bicubic")
+    # Distinct input shapes (one per aspect ratio) kept as CUDA graphs
+    MAX_CUDA_GRAPHS = 16
+    # (height, width) aspect ratios whose input shapes DEPTH_COMPILE warms up
+    COMPILE_WARM_UP_ASPECTS = ((1, 1), (3, 4), (4, 3))
 
     def __init__(self):
         self._processor = None
+        self._to_float = None
+        self._normalize = None
         self._model = None
         self._device = None
+        self._load_lock = threading.Lock()
+        self._graphs = {}
+        # Serialises device work while CUDA graphs are on (see _device_work)
+        self._device_lock = threading.Lock()
 
     @staticmethod
+    @functools.cache
     def _detect_device() -> torch.device:
         if torch.backends.mps.is_available():
             return torch.device("mps")
@@ -34,36 +51,268 @@ class DepthAnythingV2Adapter:
     def _load(self):
         if self._model is not None:
             return
+        # Warm-up and an early request may both trigger the first load
+        with self._load_lock:
+            if self._model is None:
+                self._load_model()
 
+    def _load_model(self):
         cache_dir = os.environ.get(
             "HF_HOME",
             os.path.join(os.path.dirname(__file__), "..", "..", "models"),
         )
         self._device = self._detect_device()
+        device_type = self._device.type
+        # Bilinear is visually the same as bicubic in an 8-bit depth map and
+        # several times cheaper at full output resolution.
+        self._interp_mode = os.environ.get("DEPTH_INTERP", "bilinear")
+        if self._interp_mode not in self.INTERP_MODES:
+            raise ValueError(
+                f"DEPTH_INTERP must be one of {self.INTERP_MODES}, "
+                f"got {self._interp_mode!r}"
+            )
         logger.info("Loading %s on %s", self.MODEL_ID, self._device)
 
         self._processor = AutoImageProcessor.from_pretrained(
             self.MODEL_ID, cache_dir=cache_dir
         )
-        self._model = AutoModelForDepthEstimation.from_pretrained(
+        self._build_preprocess()
+        model = AutoModelForDepthEstimation.from_pretrained(
             self.MODEL_ID, cache_dir=cache_dir
         )
-        self._model.to(self._device)
-        self._model.eval()
+        model = model.to(self._device).to(memory_format=torch.channels_last)
+        model.eval()
 
-    def predict(self, image: Image.Image) -> np.ndarray:
+        # fp16 weights halve activation bandwidth on CUDA; MPS gets bf16 via
+        # autocast (needs torch 2.5+) and the CPU stays in fp32.
+        if device_type == "cuda":
+            model.half()
+        self._input_dtype = torch.float16 if device_type == "cuda" else torch.float32
+        autocast_dtype = {"cuda": torch.float16, "mps": torch.bfloat16}.get(
+            device_type
+        )
+        # Resolved once so each forward only unpacks ready-made arguments
+        self._autocast_args = {
+            "device_type": device_type,
+            "dtype": autocast_dtype or torch.bfloat16,
+            "enabled": autocast_dtype is not None,
+        }
+
+        compile_mode = os.environ.get("DEPTH_COMPILE")
+        if compile_mode:
+            model = self._compile(model, compile_mode, cache_dir)
+
+        # torch.compile's reduce-overhead mode already records CUDA graphs
+        self._use_cuda_graphs = (
+            device_type == "cuda"
+            and not compile_mode
+            and os.environ.get("DEPTH_CUDA_GRAPHS", "1") != "0"
+        )
+        if self._use_cuda_graphs:
+            # Autocast's weight-cast cache must not leak into captured graphs
+            self._autocast_args["cache_enabled"] = False
+            self._graph_pool = torch.cuda.graph_pool_handle()
+        # Assigned last: a non-None _model means loading has finished
+        self._model = model
+
+    def _compile(
+        self, model: torch.nn.Module, mode: str, cache_dir: str
+    ) -> torch.nn.Module:
+        """Compile the model with ``torch.compile``, falling back to eager.
+
+        Any failure, including an unrecognised ``mode``, keeps the eager
+        model. Compilation is lazy and specialises on input shape, so two
+        forwards per :attr:`COMPILE_WARM_UP_ASPECTS` shape are run here to
+        pay for it (and for CUDA graph capture) at load time; other aspect
+        ratios compile on their first request. Inductor artifacts are cached
+        next to the model weights.
+        """
+        os.environ.setdefault(
+            "TORCHINDUCTOR_CACHE_DIR", os.path.join(cache_dir, "torchinductor")
+        )
+        logger.info("Compiling %s with mode=%s", self.MODEL_ID, mode)
+        shapes = dict.fromkeys(
+            self._resize_shape(*aspect) for aspect in self.COMPILE_WARM_UP_ASPECTS
+        )
+        try:
+            compiled = torch.compile(model, mode=mode)
+            for shape in shapes:
+                example = torch.zeros(
+                    1, 3, *shape, device=self._device, dtype=self._input_dtype
+                ).to(memory_format=torch.channels_last)
+                for _ in range(2):
+                    self._forward(compiled, example)
+        except Exception:
+            logger.exception("torch.compile failed; using the eager model")
+            return model
+        return compiled
+
+    def _forward(self, model: torch.nn.Module, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode(), torch.autocast(**self._autocast_args):
+            outputs = model(pixel_values=batch)
+        # Back to fp32 so the bicubic upsample keeps full precision
+        return outputs.predicted_depth.float()
+
+    def _run(self, batch: torch.Tensor) -> torch.Tensor:
+        """Forward ``batch``, replaying a captured CUDA graph when possible.
+
+        Single-image batches dominate interactive traffic and every input of
+        a given aspect ratio has the same shape, so on CUDA each shape is
+        captured once and replayed, skipping per-kernel launch overhead.
+        Other devices, larger batches and new shapes beyond
+        ``MAX_CUDA_GRAPHS`` run eagerly. Callers hold :meth:`_device_work`.
+        """
+        if not self._use_cuda_graphs or batch.shape[0] != 1:
+            return self._forward(self._model, batch)
+
+        key = tuple(batch.shape)
+        entry = self._graphs.get(key)
+        if entry is None:
+            if len(self._graphs) >= self.MAX_CUDA_GRAPHS:
+                return self._forward(self._model, batch)
+            entry = self._graphs[key] = self._capture(batch)
+
+        graph, static_in, static_out = entry
+        static_in.copy_(batch)
+        graph.replay()
+        # The next replay overwrites static_out
+        return static_out.clone()
+
+    def _capture(self, batch: torch.Tensor):
+        """Record the forward for ``batch``'s shape into a CUDA graph."""
+        logger.info("Capturing CUDA graph for input shape %s", tuple(batch.shape))
+        static_in = batch.clone()
+
+        # Warm up on a side stream so lazy initialisation is not captured
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self._forward(self._model, static_in)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self._graph_pool):
+            static_out = self._forward(self._model, static_in)
+        return graph, static_in, static_out
+
+    def _build_preprocess(self):
+        """Mirror the HF processor's resize + normalise as on-device transforms.
+
+        The processor resizes and normalises on the CPU for every call; the
+        same steps as torchvision ops run on the model's device instead.
+        """
+        processor = self._processor
+        self._input_size = (processor.size["height"], processor.size["width"])
+        self._keep_aspect_ratio = getattr(processor, "keep_aspect_ratio", False)
+        self._multiple = getattr(processor, "ensure_multiple_of", None) or 1
+        self._to_float = v2.ToDtype(torch.float32, scale=True)
+        self._normalize = v2.Normalize(
+            mean=list(processor.image_mean), std=list(processor.image_std)
+        )
+
+    def _resize_shape(self, height: int, width: int) -> tuple[int, int]:
+        """Model input size for an image, as computed by the DPT processor."""
+        scale_h = self._input_size[0] / height
+        scale_w = self._input_size[1] / width
+        if self._keep_aspect_ratio:
+            # Scale as little as possible
+            if abs(1 - scale_w) < abs(1 - scale_h):
+                scale_h = scale_w
+            else:
+                scale_w = scale_h
+
+        def constrain(value: float) -> int:
+            rounded = round(value / self._multiple) * self._multiple
+            if rounded == 0:
+                rounded = math.ceil(value / self._multiple) * self._multiple
+            return rounded
+
+        return constrain(scale_h * height), constrain(scale_w * width)
+
+    def _preprocess(self, image: np.ndarray) -> torch.Tensor:
+        # Wrap the HWC array without copying, upload it as uint8 (4x smaller
+        # than float32), then resize on the device
+        height, width = image.shape[:2]
+        pixels = (
+            torch.from_numpy(image)
+            .permute(2, 0, 1)
+            .to(self._device, non_blocking=True)
+        )
+        pixels = v2.functional.resize(
+            self._to_float(pixels),
+            list(self._resize_shape(height, width)),
+            interpolation=v2.InterpolationMode.BICUBIC,
+            antialias=True,
+        )
+        return self._normalize(pixels).unsqueeze(0)
+
+    def predict(self, image: np.ndarray) -> np.ndarray:
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
         self._load()
-        inputs = self._processor(images=image, return_tensors="pt").to(self._device)
-        with torch.no_grad():
-            outputs = self._model(**inputs)
-
-        predicted_depth = outputs.predicted_depth
-        # Interpolate to original image size
-        prediction = torch.nn.functional.interpolate(
-            predicted_depth.unsqueeze(1),
-            size=image.size[::-1],  # (height, width)
-            mode="bicubic",
-            align_corners=False,
-        ).squeeze()
-
-        return prediction.cpu().numpy()
+        with self._device_work():
+            return [depth.cpu().numpy() for depth in self._predict_tensors(images)]
+
+    def predict_batch_uint8(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        self._load()
+        with self._device_work():
+            # Normalise and cast on the device: the host copy is 4x smaller
+            return [
+                self._to_uint8(depth).cpu().numpy()
+                for depth in self._predict_tensors(images)
+            ]
+
+    def _device_work(self):
+        """Guard one prediction's device work, from upload to host copy.
+
+        CUDA graph capture is device-global: any allocation or sync issued
+        from another thread while a graph records (a preprocessing upload,
+        an eager batch, a host copy) invalidates the capture. With graphs
+        enabled whole predictions are therefore serialised; the GPU runs one
+        batch at a time anyway. Otherwise calls may overlap freely.
+        """
+        if self._use_cuda_graphs:
+            return self._device_lock
+        return contextlib.nullcontext()
+
+    @staticmethod
+    def _to_uint8(depth: torch.Tensor) -> torch.Tensor:
+        min_val = depth.amin()
+        # No host sync on a constant map: it scales to zeros via the clamp
+        span = (depth.amax() - min_val).clamp_min(1e-8)
+        # Divide before scaling so the maximum is exactly 1.0 and lands on
+        # 255; a single 255 / span factor can truncate it to 254.
+        return ((depth - min_val) / span * 255).clamp_(0, 255).to(torch.uint8)
+
+    def _predict_tensors(self, images: list[np.ndarray]) -> list[torch.Tensor]:
+        """Full-resolution fp32 depth maps, left on the model's device."""
+        self._load()
+
+        # Resizing keeps aspect ratio, so inputs only stack when their
+        # resized shapes match: run one forward pass per shape group.
+        pixel_values = [self._preprocess(image) for image in images]
+        groups: dict[tuple[int, ...], list[int]] = {}
+        for i, values in enumerate(pixel_values):
+            groups.setdefault(tuple(values.shape), []).append(i)
+
+        run = self._run
+        input_dtype = self._input_dtype
+        results: list[torch.Tensor | None] = [None] * len(images)
+        for indices in groups.values():
+            batch = torch.cat([pixel_values[i] for i in indices]).to(
+                dtype=input_dtype, memory_format=torch.channels_last
+            )
+            predicted_depth = run(batch)
+
+            for row, i in enumerate(indices):
+                # Interpolate to original image size
+                results[i] = F.interpolate(
+                    predicted_depth[row : row + 1].unsqueeze(1),
+                    size=images[i].shape[:2],
+                    mode=self._interp_mode,
+                    align_corners=False,
+                )[0, 0]
+
+        return results
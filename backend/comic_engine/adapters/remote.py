@@ -0,0 +1,283 @@
+"""Outbound adapter: depth model hosted in a separate inference process.
+
+Lets several API worker processes share one copy of the model weights.
+Pixel data travels through ``multiprocessing.shared_memory`` blocks; only
+block names and shapes go over the socket.
+
+Client side: :class:`RemoteDepthModel` implements ``DepthModelPort``.
+Server side: :func:`serve` answers requests with any local
+``DepthModelPort``, coalescing concurrent requests from all connected
+clients into one batched call. ``inference_worker.py`` runs it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Port methods a client may call; all take and return lists of arrays
+_BATCH_METHODS = ("predict_batch", "predict_batch_uint8")
+
+# Wire format of one array: (shared memory block name, shape, dtype string)
+_ArrayRef = tuple[str, tuple[int, ...], str]
+
+
+def _untrack(shm: SharedMemory):
+    # The peer process owns unlinking; stop this process's resource tracker
+    # from unlinking (or warning about) the block when it exits.
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def _put_array(array: np.ndarray) -> tuple[SharedMemory, _ArrayRef]:
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _read_array(
+    ref: _ArrayRef, untrack: bool = False
+) -> tuple[SharedMemory, np.ndarray]:
+    name, shape, dtype = ref
+    shm = SharedMemory(name=name)
+    if untrack:
+        _untrack(shm)
+    try:
+        return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    except Exception:
+        shm.close()  # e.g. the shape does not fit the block
+        raise
+
+
+def inference_authkey() -> bytes:
+    """Shared secret for the inference socket, from ``DEPTH_INFERENCE_AUTHKEY``.
+
+    Connections exchange pickles, so both sides must prove they know it.
+
+    Raises:
+        RuntimeError: If the variable is unset or empty.
+    """
+    authkey = os.environ.get("DEPTH_INFERENCE_AUTHKEY", "")
+    if not authkey:
+        raise RuntimeError("DEPTH_INFERENCE_AUTHKEY must be set")
+    return authkey.encode()
+
+
+class RemoteDepthModel:
+    """Outbound adapter: depth model served by ``inference_worker.py``.
+
+    Args:
+        address: Unix socket path the inference worker listens on.
+        authkey: Shared secret the worker was started with.
+        connect_timeout: Seconds to keep retrying while the worker starts
+            up (it only listens once its model is loaded and warm).
+    """
+
+    def __init__(self, address: str, authkey: bytes, connect_timeout: float = 120.0):
+        self._address = address
+        self._authkey = authkey
+        self._connect_timeout = connect_timeout
+        self._conn: Connection | None = None
+        # One request in flight per connection
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Connection:
+        deadline = time.monotonic() + self._connect_timeout
+        while True:
+            try:
+                return Client(self._address, family="AF_UNIX", authkey=self._authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _call(self, method: str, images: list[np.ndarray]) -> list[np.ndarray]:
+        inputs = [_put_array(np.ascontiguousarray(image)) for image in images]
+        try:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+                try:
+                    self._conn.send((method, [ref for _, ref in inputs]))
+                    status, payload = self._conn.recv()
+                except (EOFError, OSError):
+                    # Worker went away; reconnect on the next call
+                    self._conn = None
+                    raise
+        finally:
+            for shm, _ in inputs:
+                shm.close()
+                shm.unlink()
+
+        if status != "ok":
+            raise RuntimeError(f"Inference worker failed: {payload}")
+
+        results = []
+        for ref in payload:
+            shm, array = _read_array(ref)
+            results.append(array.copy())
+            del array  # release the buffer so the block can close
+            shm.close()
+            shm.unlink()
+        return results
+
+    def predict(self, image: np.ndarray) -> np.ndarray:
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        return self._call("predict_batch", images)
+
+    def predict_batch_uint8(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        return self._call("predict_batch_uint8", images)
+
+
+class _Job:
+    """One client request waiting for the model thread."""
+
+    def __init__(self, method: str, images: list[np.ndarray]):
+        self.method = method
+        self.images = images
+        self.results: list[np.ndarray] | None = None
+        self.error: str | None = None
+        self.done = threading.Event()
+
+
+def _run_model(model, jobs: queue.Queue, max_batch: int):
+    """Drain queued jobs into batched model calls until a None sentinel."""
+    pending: _Job | None = None
+    while True:
+        job = pending if pending is not None else jobs.get()
+        pending = None
+        if job is None:
+            return
+
+        # Coalesce whatever else is already queued for the same method
+        batch = [job]
+        size = len(job.images)
+        while size < max_batch:
+            try:
+                nxt = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None:
+                jobs.put(None)  # stop after this batch
+                break
+            if nxt.method != job.method:
+                pending = nxt
+                break
+            batch.append(nxt)
+            size += len(nxt.images)
+
+        images = [image for b in batch for image in b.images]
+        try:
+            results = getattr(model, job.method)(images)
+        except Exception as exc:
+            logger.exception("Batch of %d failed", len(images))
+            # Only the message crosses back: the traceback would pin the
+            # shared memory views the handlers are about to close.
+            for b in batch:
+                b.error = repr(exc)
+        else:
+            start = 0
+            for b in batch:
+                b.results = results[start : start + len(b.images)]
+                start += len(b.images)
+        del images
+        for b in batch:
+            b.done.set()
+
+
+def _handle_client(conn: Connection, jobs: queue.Queue):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                reply = _handle_request(*request, jobs=jobs)
+            except Exception as exc:
+                logger.exception("Rejected malformed inference request")
+                reply = ("error", repr(exc))
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+def _handle_request(method: str, refs: list[_ArrayRef], jobs: queue.Queue):
+    if method not in _BATCH_METHODS:
+        return ("error", f"unknown method {method!r}")
+
+    blocks: list[SharedMemory] = []
+    images: list[np.ndarray] | None = []
+    image = job = None
+    try:
+        for ref in refs:
+            # The client unlinks its inputs
+            shm, image = _read_array(ref, untrack=True)
+            blocks.append(shm)
+            images.append(image)
+        job = _Job(method, images)
+        images = image = None
+        jobs.put(job)
+        job.done.wait()
+    finally:
+        # Drop every view of the blocks before closing them
+        images = image = None
+        if job is not None:
+            job.images = None
+        for shm in blocks:
+            shm.close()
+
+    if job.error is not None:
+        return ("error", job.error)
+
+    outputs = [_put_array(result) for result in job.results]
+    for shm, _ in outputs:
+        _untrack(shm)  # the client unlinks it after reading
+        shm.close()
+    return ("ok", [ref for _, ref in outputs])
+
+
+def serve(model, listener: Listener, max_batch: int = 8):
+    """Serve ``model`` to :class:`RemoteDepthModel` clients on ``listener``.
+
+    Each connection gets a thread; a single model thread runs the batched
+    calls. Blocks until accepting fails (e.g. the listener was closed).
+
+    Args:
+        model: Any object satisfying ``DepthModelPort``.
+        listener: ``multiprocessing.connection.Listener`` to accept on.
+        max_batch: Maximum number of images coalesced into one call.
+    """
+    jobs: queue.Queue = queue.Queue()
+    model_thread = threading.Thread(
+        target=_run_model, args=(model, jobs, max_batch), daemon=True
+    )
+    model_thread.start()
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                logger.warning("Inference client failed the handshake", exc_info=True)
+                continue
+            except OSError:
+                return  # listener closed
+            threading.Thread(
+                target=_handle_client, args=(conn, jobs), daemon=True
+            ).start()
+    finally:
+        jobs.put(None)
+        model_thread.join()
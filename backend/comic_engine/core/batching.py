@@ -0,0 +1,96 @@
+"""Async micro-batching of depth predictions.
+
+Concurrent requests are coalesced into a single ``predict_batch`` call so
+the model runs one forward pass per batch instead of one per request.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import anyio
+
+
+class _Batch:
+    """Inputs collected for one ``predict_batch`` call and their outputs."""
+
+    def __init__(self):
+        self.items: list[Any] = []
+        self.results: list[Any] | None = None
+        self.error: BaseException | None = None
+        self.full = anyio.Event()
+        self.done = anyio.Event()
+
+
+class BatchScheduler:
+    """Coalesce concurrent ``submit`` calls into batched model calls.
+
+    The first caller to arrive opens a batch and acts as its leader: it
+    waits up to ``max_delay_ms`` (or until the batch is full), then runs
+    ``predict_batch`` in a worker thread and hands every caller its slice.
+    Batches run one at a time, so a batch keeps filling while the previous
+    one is still on the model. No background task is needed, which keeps
+    the scheduler usable under any anyio backend.
+
+    Args:
+        predict_batch: Callable mapping a list of inputs to a list of outputs
+            of the same length (e.g. ``DepthModelPort.predict_batch``).
+        max_batch: Maximum number of inputs per batch.
+        max_delay_ms: How long the leader waits for more inputs before
+            running a partial batch.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[list[Any]], list[Any]],
+        max_batch: int = 8,
+        max_delay_ms: float = 10.0,
+    ):
+        self._predict_batch = predict_batch
+        self._max_batch = max_batch
+        self._max_delay = max_delay_ms / 1000.0
+        self._open: _Batch | None = None
+        self._lock = anyio.Lock()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue ``item`` for the next batch and wait for its result."""
+        batch = self._open
+        leader = batch is None
+        if leader:
+            batch = self._open = _Batch()
+
+        index = len(batch.items)
+        batch.items.append(item)
+        if len(batch.items) >= self._max_batch:
+            self._close(batch)
+
+        if leader:
+            # Shielded so a disconnecting leader cannot strand its followers
+            with anyio.CancelScope(shield=True):
+                await self._run(batch)
+        else:
+            await batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def _close(self, batch: _Batch):
+        if self._open is batch:
+            self._open = None
+        batch.full.set()
+
+    async def _run(self, batch: _Batch):
+        with anyio.move_on_after(self._max_delay):
+            await batch.full.wait()
+
+        async with self._lock:
+            self._close(batch)
+            try:
+                batch.results = await anyio.to_thread.run_sync(
+                    self._predict_batch, batch.items
+                )
+            except Exception as exc:
+                batch.error = exc
+            finally:
+                batch.done.set()
@@ -0,0 +1,65 @@
+"""Content-addressed caching of depth results."""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from typing import Any
+
+
+def content_hasher():
+    """Incremental hasher whose hex digest identifies content (128-bit BLAKE2b)."""
+    return hashlib.blake2b(digest_size=16)
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entries.
+
+    Bounded both by entry count and by the total of the sizes given to
+    :meth:`put`, so a few very large values cannot grow it without limit.
+    Not thread-safe: meant to be used from the event loop only.
+
+    Args:
+        maxsize: Maximum number of entries kept.
+        max_bytes: Maximum total size of the entries kept; None for no limit.
+    """
+
+    def __init__(self, maxsize: int = 256, max_bytes: int | None = None):
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the entries currently kept."""
+        return self._bytes
+
+    def get(self, key: str) -> Any | None:
+        """Return the value for ``key`` (marking it recently used), or None."""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return None
+        return self._entries[key][0]
+
+    def put(self, key: str, value: Any, size: int = 0):
+        """Store ``value`` under ``key``, evicting the oldest entries if full.
+
+        Values larger than ``max_bytes`` on their own are not stored.
+        """
+        if self._max_bytes is not None and size > self._max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self._maxsize or (
+            self._max_bytes is not None and self._bytes > self._max_bytes
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
@@ -3,29 +3,65 @@
 from __future__ import annotations
 
 import numpy as np
-from PIL import Image
 
 from comic_engine.core.ports import DepthModelPort
 
 
-def estimate_depth(image: Image.Image, model: DepthModelPort) -> np.ndarray:
+def estimate_depth(image: np.ndarray, model: DepthModelPort) -> np.ndarray:
     """Estimate a normalised depth map from an image.
 
     Args:
-        image: RGB PIL Image.
+        image: RGB uint8 array of shape (height, width, 3).
         model: Any object satisfying :class:`DepthModelPort`.
 
     Returns:
         2-D float32 array of shape (height, width) with values in [0, 1].
         Convention: 0 = far, 1 = near.
     """
-    raw = model.predict(image)
+    return normalise_depth(model.predict(image))
 
+
+def normalise_depth(raw: np.ndarray) -> np.ndarray:
+    """Rescale a raw model depth map to [0, 1].
+
+    Args:
+        raw: 2-D array of raw depth values as returned by
+            :meth:`DepthModelPort.predict`.
+
+    Returns:
+        2-D float32 array of the same shape with values in [0, 1].
+        A constant input maps to all zeros.
+    """
     min_val = raw.min()
     max_val = raw.max()
 
-    if min_val == max_val:
-        return np.zeros_like(raw, dtype=np.float32)
+    # Subtract straight into the float32 output and divide in place. The
+    # span is computed in float32 like the output, so the maximum maps to
+    # exactly 1. A constant input subtracts to zeros and skips the divide.
+    out = np.subtract(raw, min_val, dtype=np.float32)
+    span = np.subtract(max_val, min_val, dtype=np.float32)
+    np.divide(out, span, out=out, where=span > 0)
+    return out
+
 
-    normalised = (raw - min_val) / (max_val - min_val)
-    return normalised.astype(np.float32)
+def normalise_depth_uint8(raw: np.ndarray) -> np.ndarray:
+    """Rescale a raw model depth map to 8-bit.
+
+    Reference implementation of the :meth:`DepthModelPort.predict_batch_uint8`
+    contract: exactly ``normalise_depth`` followed by the ``* 255`` / cast in
+    :func:`depth_to_png`. Adapters normalise on their own device instead;
+    this goes through the full float32 map and is not a fast path.
+
+    Args:
+        raw: 2-D array of raw depth values as returned by
+            :meth:`DepthModelPort.predict`.
+
+    Returns:
+        2-D uint8 array of the same shape with values in [0, 255].
+        A constant input maps to all zeros.
+    """
+    # Scale after normalising: folding 255 / span into one factor lets
+    # rounding push the maximum just under 255, which truncates to 254.
+    out = np.empty(raw.shape, dtype=np.uint8)
+    np.multiply(normalise_depth(raw), np.float32(255), out=out, casting="unsafe")
+    return out
@@ -3,30 +3,154 @@
 from __future__ import annotations
 
 import io
+import warnings
 
 import numpy as np
 from PIL import Image
 
+try:
+    import imagecodecs
+except ImportError:  # optional: pip install ".[fast-decode]"
+    imagecodecs = None
 
-def decode_upload(file_bytes: bytes) -> Image.Image:
-    """Decode uploaded bytes into an RGB PIL Image.
+try:
+    import pillow_avif  # noqa: F401  (registers AVIF on Pillow < 11.2)
+except ImportError:  # optional: pip install ".[avif]"
+    pass
+
+_JPEG_MAGIC = b"\xff\xd8\xff"
+_JPEG_EOI = b"\xff\xd9"
+_PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# Uploads larger than this are rejected before any decoding
+MAX_BYTES = 20 * 1024 * 1024
+# Decoded images are downscaled to fit within MAX_SIDE x MAX_SIDE ...
+MAX_SIDE = 4096
+MAX_PIXELS = MAX_SIDE * MAX_SIDE
+# ... and rejected outright (decompression bomb guard) above this
+MAX_DECODE_PIXELS = 4 * MAX_PIXELS
+
+# Depth map encodings: name -> (media type, PIL save options). PNG is
+# lossless and the default; level 1 encodes ~3x faster than the default 6
+# on smooth depth maps. WebP and AVIF are lossy at quality 90 (well under
+# one grey level of mean error) for ~6-9x smaller responses, with their
+# fastest settings: WebP method 0 encodes about as fast as PNG level 1.
+DEPTH_FORMATS = {"png": ("image/png", {"format": "PNG", "compress_level": 1})}
+Image.init()  # load every plugin so Image.SAVE lists all encoders
+if "WEBP" in Image.SAVE:
+    DEPTH_FORMATS["webp"] = (
+        "image/webp",
+        {"format": "WEBP", "quality": 90, "method": 0},
+    )
+if "AVIF" in Image.SAVE:
+    DEPTH_FORMATS["avif"] = (
+        "image/avif",
+        {"format": "AVIF", "quality": 90, "speed": 10},
+    )
+
+
+class ImageTooLargeError(ValueError):
+    """Upload exceeds :data:`MAX_BYTES` or :data:`MAX_DECODE_PIXELS`."""
+
+
+def decode_upload(file_bytes: bytes) -> np.ndarray:
+    """Decode uploaded bytes into an RGB pixel array.
+
+    JPEG and PNG go through imagecodecs (libjpeg-turbo / libpng) when it is
+    installed; anything it cannot handle falls back to PIL. The image size
+    is read from the header first: images over :data:`MAX_PIXELS` are
+    downscaled to fit within :data:`MAX_SIDE` (JPEGs already while
+    decoding), bounding memory and compute per request.
 
     Args:
         file_bytes: Raw image file bytes (PNG, JPEG, etc.).
 
     Returns:
-        PIL Image in RGB mode.
+        uint8 array of shape (height, width, 3).
 
     Raises:
+        ImageTooLargeError: If the upload or its pixel count is too large.
         ValueError: If the bytes cannot be decoded as an image.
     """
+    if len(file_bytes) > MAX_BYTES:
+        raise ImageTooLargeError(
+            f"Upload exceeds the {MAX_BYTES // (1024 * 1024)} MB limit"
+        )
+
+    too_many_pixels = f"exceeds the {MAX_DECODE_PIXELS} pixel limit"
+    try:
+        with warnings.catch_warnings():
+            # PIL's own bomb check runs inside open(): its warning is moot
+            # (the stricter cap below applies) and its error is a 413 too.
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            img = Image.open(io.BytesIO(file_bytes))  # parses the header only
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLargeError(f"Image {too_many_pixels}") from exc
+    except Exception as exc:
+        raise ValueError("Invalid image data") from exc
+
+    width, height = img.size
+    if width * height > MAX_DECODE_PIXELS:
+        raise ImageTooLargeError(f"Image of {width}x{height} {too_many_pixels}")
+    downscale = width * height > MAX_PIXELS
+
+    if not downscale:
+        pixels = _decode_fast(file_bytes)
+        if pixels is not None:
+            return pixels
+
     try:
-        img = Image.open(io.BytesIO(file_bytes))
+        if downscale:
+            # JPEG: let libjpeg decode at a reduced scale (no-op otherwise)
+            img.draft("RGB", (MAX_SIDE, MAX_SIDE))
         img.load()  # force full decode to catch truncated data
     except Exception as exc:
         raise ValueError("Invalid image data") from exc
 
-    return img.convert("RGB")
+    # convert() always copies, so skip it when the image is already RGB
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if downscale:
+        img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+    return np.array(img)
+
+
+def _decode_fast(file_bytes: bytes) -> np.ndarray | None:
+    """Decode JPEG/PNG bytes to an RGB uint8 array, or None to use PIL."""
+    if imagecodecs is None:
+        return None
+
+    try:
+        if file_bytes.startswith(_JPEG_MAGIC):
+            # libjpeg pads a truncated JPEG with grey rows instead of failing,
+            # so leave anything without an end-of-image marker to PIL
+            tail = bytes(file_bytes[-64:]).rstrip(b"\x00\r\n\t ")
+            if not tail.endswith(_JPEG_EOI):
+                return None
+            pixels = imagecodecs.jpeg8_decode(file_bytes)
+            # 4 channels from a JPEG means CMYK, which PIL converts properly
+            max_channels = 3
+        elif file_bytes.startswith(_PNG_MAGIC):
+            pixels = imagecodecs.png_decode(file_bytes)
+            max_channels = 4
+        else:
+            return None
+    except Exception:
+        return None  # corrupt or unsupported: let PIL decide
+
+    if pixels.dtype != np.uint8:
+        return None
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, np.newaxis]
+
+    channels = pixels.shape[2]
+    if channels > max_channels:
+        return None
+    if channels <= 2:
+        # Grey (+ alpha): replicate the grey channel like convert("RGB")
+        return np.repeat(pixels[:, :, :1], 3, axis=2)
+    # Alpha is dropped, as PIL's convert("RGB") does
+    return np.ascontiguousarray(pixels[:, :, :3])
 
 
 def depth_to_png(depth_array: np.ndarray) -> bytes:
@@ -39,7 +163,24 @@ def depth_to_png(depth_array: np.ndarray) -> bytes:
         PNG-encoded bytes.
     """
     uint8 = (depth_array * 255).clip(0, 255).astype(np.uint8)
-    img = Image.fromarray(uint8, mode="L")
+    return encode_depth_uint8(uint8, "png")
+
+
+def encode_depth_uint8(depth_uint8: np.ndarray, fmt: str = "png") -> bytes:
+    """Encode an 8-bit depth map as a grayscale image.
+
+    Args:
+        depth_uint8: 2-D uint8 array, e.g. from ``normalise_depth_uint8``.
+        fmt: A key of :data:`DEPTH_FORMATS`.
+
+    Returns:
+        Encoded image bytes.
+    """
+    _, save_options = DEPTH_FORMATS[fmt]
+    # Wrap the (contiguous) array without copying it into a PIL buffer
+    pixels = np.ascontiguousarray(depth_uint8)
+    height, width = pixels.shape
+    img = Image.frombuffer("L", (width, height), pixels, "raw", "L", 0, 1)
     buf = io.BytesIO()
-    img.save(buf, format="PNG")
+    img.save(buf, **save_options)
     return buf.getvalue()
@@ -9,7 +9,6 @@ from __future__ import annotations
 from typing import Protocol, runtime_checkable
 
 import numpy as np
-from PIL import Image
 
 
 @runtime_checkable
@@ -19,14 +18,42 @@ class DepthModelPort(Protocol):
     Any depth model adapter must implement this protocol.
     """
 
-    def predict(self, image: Image.Image) -> np.ndarray:
+    def predict(self, image: np.ndarray) -> np.ndarray:
         """Run depth prediction on an image.
 
         Args:
-            image: RGB PIL Image to estimate depth for.
+            image: RGB uint8 array of shape (height, width, 3).
 
         Returns:
             2D numpy array of raw depth values (model-specific scale).
             Shape: (height, width). Higher values = closer to camera.
         """
         ...
+
+    def predict_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        """Run depth prediction on several images at once.
+
+        Args:
+            images: RGB uint8 arrays, possibly of different sizes.
+
+        Returns:
+            One raw depth array per input image, in the same order and with
+            the same contract as :meth:`predict`.
+        """
+        ...
+
+    def predict_batch_uint8(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        """Run batched depth prediction and return display-ready maps.
+
+        Lets adapters normalise on their own device and hand back 8-bit
+        data instead of full-precision floats.
+
+        Args:
+            images: RGB uint8 arrays, possibly of different sizes.
+
+        Returns:
+            One uint8 array of shape (height, width) per input image, min-max
+            normalised to [0, 255] like ``normalise_depth_uint8``.
+            Higher values = closer to camera; a constant map is all zeros.
+        """
+        ...
@@ -0,0 +1,68 @@
+"""Standalone inference process hosting the depth model.
+
+Loads Depth Anything V2 once and serves it over a Unix socket so several
+API workers can share one copy of the weights:
+
+    export DEPTH_INFERENCE_AUTHKEY=$(openssl rand -hex 32)
+    python inference_worker.py &
+    DEPTH_INFERENCE_SOCKET=/tmp/comic-engine-inference.sock \\
+        uvicorn app:app --workers 4
+
+The socket path comes from ``DEPTH_INFERENCE_SOCKET`` (default
+``/tmp/comic-engine-inference.sock``); clients must present the same
+``DEPTH_INFERENCE_AUTHKEY`` as the worker.
+"""
+
+import logging
+import os
+import socket
+import sys
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+from comic_engine.adapters.depth_anything import DepthAnythingV2Adapter
+from comic_engine.adapters.remote import inference_authkey, serve
+
+DEFAULT_SOCKET = "/tmp/comic-engine-inference.sock"
+
+logger = logging.getLogger(__name__)
+
+
+def _socket_in_use(address: str) -> bool:
+    """Whether a live process is listening on the Unix socket ``address``."""
+    with socket.socket(socket.AF_UNIX) as probe:
+        try:
+            probe.connect(address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+def _claim_socket(address: str):
+    """Exit if another worker serves ``address``, else clear a stale socket."""
+    if _socket_in_use(address):
+        sys.exit(f"Another inference worker is listening on {address}")
+    if os.path.exists(address):
+        os.unlink(address)  # left behind by a previous run
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    address = os.environ.get("DEPTH_INFERENCE_SOCKET", DEFAULT_SOCKET)
+    authkey = inference_authkey()
+    # Fail fast before the slow model load; checked again before binding
+    _claim_socket(address)
+
+    # Listen only once the model is warm: clients retry until then
+    model = DepthAnythingV2Adapter()
+    model.predict(np.zeros((64, 64, 3), dtype=np.uint8))
+
+    _claim_socket(address)
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        logger.info("Inference worker listening on %s", address)
+        serve(model, listener)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,15 @@ from __future__ import annotations
 
 import numpy as np
 import pytest
-from PIL import Image
 
 
 class MockDepthModel:
     """Fake depth model that returns a vertical gradient (0 top, 1 bottom)."""
 
-    def predict(self, image: Image.Image) -> np.ndarray:
-        w, h = image.size
+    def predict(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
         gradient = np.linspace(0.0, 1.0, num=h, dtype=np.float32)
-        return np.tile(gradient[:, np.newaxis], (1, w))
+        return np.broadcast_to(gradient[:, np.newaxis], (h, w))
 
 
 @pytest.fixture()
@@ -22,8 +21,8 @@ def mock_model() -> MockDepthModel:
 
 
 @pytest.fixture()
-def test_image() -> Image.Image:
-    return Image.new("RGB", (64, 64), color=(128, 128, 128))
+def test_image() -> np.ndarray:
+    return np.full((64, 64, 3), 128, dtype=np.uint8)
 
 
 @pytest.fixture()
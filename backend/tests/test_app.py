@@ -4,25 +4,31 @@ from __future__ import annotations
 
 import io
 import sys
+import threading
 from types import SimpleNamespace
 from unittest.mock import MagicMock
 
+import anyio
 import numpy as np
 import pytest
 from PIL import Image
 
-# If torch/transformers are not installed, provide stub modules so that
-# importing the app module (which imports the adapter) does not fail.
+# If torch/torchvision/transformers are not installed, stand in for the
+# adapter module so importing the app module does not fail; every test
+# swaps in _MockModel anyway.
 try:
-    import torch as _torch_check  # noqa: F401
+    import comic_engine.adapters.depth_anything  # noqa: F401
 except ImportError:
-    _torch_mock = MagicMock()
-    _torch_mock.device = type("device", (), {"__init__": lambda self, x: None})
-    sys.modules["torch"] = _torch_mock
-    sys.modules["transformers"] = MagicMock()
+    sys.modules["comic_engine.adapters.depth_anything"] = SimpleNamespace(
+        DepthAnythingV2Adapter=MagicMock
+    )
 
 import app as app_module  # noqa: E402
 from app import app  # noqa: E402
+from comic_engine.core.batching import BatchScheduler  # noqa: E402
+from comic_engine.core import image_utils  # noqa: E402
+from comic_engine.core.cache import LRUCache  # noqa: E402
+from comic_engine.core.depth import normalise_depth_uint8  # noqa: E402
 
 from httpx import ASGITransport, AsyncClient  # noqa: E402
 
@@ -36,18 +42,35 @@ def _make_png_bytes(width: int = 64, height: int = 64) -> bytes:
 
 
 class _MockModel:
-    """Fake model returning a vertical gradient."""
+    """Fake model returning a vertical gradient; records batch sizes."""
 
-    def predict(self, image: Image.Image) -> np.ndarray:
-        w, h = image.size
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+
+    def predict(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
         gradient = np.linspace(0.0, 1.0, num=h, dtype=np.float32)
-        return np.tile(gradient[:, np.newaxis], (1, w))
+        return np.broadcast_to(gradient[:, np.newaxis], (h, w))
+
+    def predict_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        return [self.predict(image) for image in images]
+
+    def predict_batch_uint8(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        self.batch_sizes.append(len(images))
+        return [normalise_depth_uint8(self.predict(image)) for image in images]
 
 
 @pytest.fixture(autouse=True)
 def _patch_model(monkeypatch):
     """Replace the real model with a mock for all tests in this module."""
-    monkeypatch.setattr(app_module, "_model", _MockModel())
+    model = _MockModel()
+    monkeypatch.setattr(app_module, "_model", model)
+    monkeypatch.setattr(
+        app_module, "_scheduler", BatchScheduler(model.predict_batch_uint8, max_delay_ms=50)
+    )
+    monkeypatch.setattr(app_module, "_model_ready", True)
+    monkeypatch.setattr(app_module, "_cache", LRUCache(maxsize=4))
+    return model
 
 
 @pytest.mark.anyio
@@ -59,6 +82,59 @@ async def test_health():
     assert resp.json() == {"status": "ok"}
 
 
+@pytest.mark.anyio
+async def test_health_returns_503_until_model_warm(monkeypatch):
+    monkeypatch.setattr(app_module, "_model_ready", False)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.get("/api/health")
+    assert resp.status_code == 503
+    assert resp.json() == {"status": "loading"}
+
+
+@pytest.mark.anyio
+async def test_lifespan_warms_model(monkeypatch, _patch_model):
+    monkeypatch.setattr(app_module, "_model_ready", False)
+    warm_up_sizes = []
+    predict = _patch_model.predict
+
+    def recording_predict(image):
+        warm_up_sizes.append(image.shape)
+        return predict(image)
+
+    monkeypatch.setattr(_patch_model, "predict", recording_predict)
+
+    async with app.router.lifespan_context(app):
+        with anyio.fail_after(5):
+            while not app_module._model_ready:
+                await anyio.sleep(0.01)
+
+    assert warm_up_sizes == [(64, 64, 3)]
+
+
+@pytest.mark.anyio
+async def test_lifespan_retries_failed_warm_up(monkeypatch, _patch_model):
+    monkeypatch.setattr(app_module, "_model_ready", False)
+    monkeypatch.setattr(app_module, "_WARM_UP_RETRY_S", 0.01)
+    attempts = []
+    predict = _patch_model.predict
+
+    def flaky_predict(image):
+        attempts.append(image.shape)
+        if len(attempts) < 3:
+            raise ConnectionRefusedError("inference worker not up yet")
+        return predict(image)
+
+    monkeypatch.setattr(_patch_model, "predict", flaky_predict)
+
+    async with app.router.lifespan_context(app):
+        with anyio.fail_after(5):
+            while not app_module._model_ready:
+                await anyio.sleep(0.01)
+
+    assert len(attempts) == 3
+
+
 @pytest.mark.anyio
 async def test_depth_returns_png():
     png = _make_png_bytes()
@@ -96,3 +172,264 @@ async def test_depth_invalid_data_returns_400():
         )
     assert resp.status_code == 400
     assert "Invalid image data" in resp.json()["detail"]
+
+
+@pytest.mark.anyio
+async def test_concurrent_depth_requests_are_batched(_patch_model):
+    transport = ASGITransport(app=app)
+    responses = {}
+
+    async def post(client, width):
+        responses[width] = await client.post(
+            "/api/depth",
+            files={"file": ("test.png", _make_png_bytes(width=width), "image/png")},
+        )
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        async with anyio.create_task_group() as tg:
+            for width in (16, 32, 48):
+                tg.start_soon(post, client, width)
+
+    for width, resp in responses.items():
+        assert resp.status_code == 200
+        assert resp.headers["x-depth-width"] == str(width)
+    assert _patch_model.batch_sizes == [3]
+
+
+@pytest.mark.anyio
+async def test_depth_codecs_run_off_the_event_loop_thread(monkeypatch):
+    loop_thread = threading.get_ident()
+    codec_threads = []
+
+    def recording(fn):
+        def wrapper(*args):
+            codec_threads.append(threading.get_ident())
+            return fn(*args)
+
+        return wrapper
+
+    monkeypatch.setattr(
+        app_module, "decode_upload", recording(app_module.decode_upload)
+    )
+    monkeypatch.setattr(
+        app_module, "encode_depth_uint8", recording(app_module.encode_depth_uint8)
+    )
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            files={"file": ("test.png", _make_png_bytes(), "image/png")},
+        )
+
+    assert resp.status_code == 200
+    assert len(codec_threads) == 2
+    assert loop_thread not in codec_threads
+
+
+@pytest.mark.anyio
+async def test_repeated_upload_is_served_from_cache(_patch_model):
+    png = _make_png_bytes(width=40, height=30)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.post(
+            "/api/depth", files={"file": ("a.png", png, "image/png")}
+        )
+        second = await client.post(
+            "/api/depth", files={"file": ("b.png", png, "image/png")}
+        )
+
+    assert first.status_code == second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.headers["x-depth-width"] == "40"
+    assert second.headers["x-depth-height"] == "30"
+    assert _patch_model.batch_sizes == [1]
+
+
+@pytest.mark.anyio
+async def test_matching_if_none_match_returns_304(_patch_model):
+    png = _make_png_bytes()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.post(
+            "/api/depth", files={"file": ("a.png", png, "image/png")}
+        )
+        etag = first.headers["etag"]
+        resp = await client.post(
+            "/api/depth",
+            files={"file": ("a.png", png, "image/png")},
+            headers={"If-None-Match": f'W/"other", {etag}'},
+        )
+
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+    assert resp.content == b""
+    assert _patch_model.batch_sizes == [1]
+
+
+@pytest.mark.anyio
+async def test_different_uploads_get_different_etags():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        a = await client.post(
+            "/api/depth",
+            files={"file": ("a.png", _make_png_bytes(width=8), "image/png")},
+        )
+        b = await client.post(
+            "/api/depth",
+            files={"file": ("b.png", _make_png_bytes(width=9), "image/png")},
+        )
+
+    assert a.headers["etag"] != b.headers["etag"]
+
+
+@pytest.mark.anyio
+async def test_oversized_content_length_returns_413(monkeypatch, _patch_model):
+    monkeypatch.setattr(app_module, "MAX_BYTES", 1024)
+    payload = bytes(200 * 1024)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            files={"file": ("big.png", payload, "image/png")},
+        )
+
+    assert resp.status_code == 413
+    assert _patch_model.batch_sizes == []
+
+
+@pytest.mark.anyio
+async def test_oversized_image_returns_413(monkeypatch):
+    monkeypatch.setattr(image_utils, "MAX_DECODE_PIXELS", 100)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            files={"file": ("test.png", _make_png_bytes(), "image/png")},
+        )
+
+    assert resp.status_code == 413
+    assert "pixel limit" in resp.json()["detail"]
+
+
+@pytest.mark.anyio
+async def test_oversized_streamed_upload_is_cut_off(monkeypatch, _patch_model):
+    monkeypatch.setattr(app_module, "MAX_BYTES", 1024)
+    sent = []
+
+    async def body():
+        # No Content-Length, so only the streaming parser can catch this
+        yield (
+            b"--xyz\r\n"
+            b'Content-Disposition: form-data; name="file"; filename="big.png"\r\n'
+            b"Content-Type: image/png\r\n\r\n"
+        )
+        for _ in range(100):
+            sent.append(1)
+            yield bytes(512)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            content=body(),
+            headers={"Content-Type": "multipart/form-data; boundary=xyz"},
+        )
+
+    assert resp.status_code == 413
+    assert len(sent) < 100
+    assert _patch_model.batch_sizes == []
+
+
+@pytest.mark.anyio
+async def test_malformed_multipart_returns_400():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            content=b"--xyz\r\nContent-Disposition form-data\r\n\r\nabc\r\n--xyz--\r\n",
+            headers={"Content-Type": "multipart/form-data; boundary=xyz"},
+        )
+
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Invalid multipart data"
+
+
+@pytest.mark.anyio
+async def test_depth_without_file_field_returns_422():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            files={"image": ("test.png", _make_png_bytes(), "image/png")},
+        )
+
+    assert resp.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_accept_header_selects_webp():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            files={"file": ("test.png", _make_png_bytes(80, 60), "image/png")},
+            headers={"Accept": "image/webp,*/*;q=0.8"},
+        )
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/webp"
+    assert "Accept" in resp.headers["vary"]
+    assert Image.open(io.BytesIO(resp.content)).size == (80, 60)
+
+
+@pytest.mark.anyio
+async def test_format_query_overrides_accept_and_changes_etag():
+    png = _make_png_bytes()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        as_png = await client.post(
+            "/api/depth",
+            params={"format": "png"},
+            files={"file": ("a.png", png, "image/png")},
+            headers={"Accept": "image/webp"},
+        )
+        as_webp = await client.post(
+            "/api/depth",
+            params={"format": "webp"},
+            files={"file": ("a.png", png, "image/png")},
+        )
+
+    assert as_png.headers["content-type"] == "image/png"
+    assert as_webp.headers["content-type"] == "image/webp"
+    assert as_png.headers["etag"] != as_webp.headers["etag"]
+
+
+@pytest.mark.anyio
+async def test_unknown_format_returns_400():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/api/depth",
+            params={"format": "gif"},
+            files={"file": ("a.png", _make_png_bytes(), "image/png")},
+        )
+
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        (None, "png"),
+        ("*/*", "png"),
+        ("image/*", "png"),
+        ("image/webp", "webp"),
+        ("image/png, image/webp;q=0.5", "png"),
+        ("image/webp;q=0", "png"),
+        ("image/png;q=0.9, image/webp", "webp"),
+    ],
+)
+def test_negotiate_format(accept, expected):
+    assert app_module._negotiate_format(accept) == expected
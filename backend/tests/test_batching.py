@@ -0,0 +1,87 @@
+"""Tests for the async micro-batching scheduler."""
+
+from __future__ import annotations
+
+import anyio
+import pytest
+
+from comic_engine.core.batching import BatchScheduler
+
+
+class _Recorder:
+    """Batch function that doubles its inputs and records each batch."""
+
+    def __init__(self):
+        self.batches: list[list[int]] = []
+
+    def __call__(self, items: list[int]) -> list[int]:
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+async def _submit_all(scheduler: BatchScheduler, items: list[int]) -> dict:
+    """Submit ``items`` concurrently; map each item to its result or error."""
+    results = {}
+
+    async def submit(item):
+        try:
+            results[item] = await scheduler.submit(item)
+        except Exception as exc:
+            results[item] = exc
+
+    async with anyio.create_task_group() as tg:
+        for item in items:
+            tg.start_soon(submit, item)
+    return results
+
+
+@pytest.mark.anyio
+async def test_concurrent_submits_share_one_batch():
+    recorder = _Recorder()
+    scheduler = BatchScheduler(recorder, max_batch=8, max_delay_ms=50)
+
+    results = await _submit_all(scheduler, list(range(5)))
+
+    assert results == {i: i * 2 for i in range(5)}
+    assert len(recorder.batches) == 1
+    assert sorted(recorder.batches[0]) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.anyio
+async def test_batches_are_capped_at_max_batch():
+    recorder = _Recorder()
+    scheduler = BatchScheduler(recorder, max_batch=2, max_delay_ms=50)
+
+    results = await _submit_all(scheduler, list(range(5)))
+
+    assert results == {i: i * 2 for i in range(5)}
+    assert sorted(len(batch) for batch in recorder.batches) == [1, 2, 2]
+
+
+@pytest.mark.anyio
+async def test_batch_error_is_raised_in_every_caller():
+    def failing(items):
+        raise RuntimeError("boom")
+
+    scheduler = BatchScheduler(failing, max_delay_ms=50)
+
+    results = await _submit_all(scheduler, [1, 2])
+
+    assert all(isinstance(r, RuntimeError) for r in results.values())
+
+
+@pytest.mark.anyio
+async def test_scheduler_recovers_after_failed_batch():
+    calls = []
+
+    def flaky(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return items
+
+    scheduler = BatchScheduler(flaky, max_delay_ms=1)
+
+    with pytest.raises(RuntimeError):
+        await scheduler.submit(1)
+    assert await scheduler.submit(2) == 2
@@ -0,0 +1,71 @@
+"""Tests for the content-addressed result cache."""
+
+from __future__ import annotations
+
+from comic_engine.core.cache import LRUCache, content_hasher
+
+
+def _digest(*chunks: bytes) -> str:
+    hasher = content_hasher()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class TestContentHasher:
+    def test_is_stable_and_content_sensitive(self):
+        assert _digest(b"abc") == _digest(b"abc")
+        assert _digest(b"abc") != _digest(b"abd")
+        assert len(_digest(b"")) == 32
+
+    def test_chunking_does_not_change_digest(self):
+        assert _digest(b"ab", b"c") == _digest(b"abc")
+
+
+class TestLRUCache:
+    def test_get_missing_returns_none(self):
+        assert LRUCache().get("missing") is None
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")  # "b" is now the oldest
+        cache.put("c", 3)
+
+        assert len(cache) == 2
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_put_existing_key_replaces_value(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("a", 2)
+
+        assert len(cache) == 1
+        assert cache.get("a") == 2
+
+    def test_evicts_to_stay_within_max_bytes(self):
+        cache = LRUCache(maxsize=10, max_bytes=100)
+        cache.put("a", "x", size=40)
+        cache.put("b", "y", size=40)
+        cache.put("c", "z", size=40)
+
+        assert cache.get("a") is None
+        assert cache.nbytes == 80
+
+    def test_replacing_entry_updates_byte_count(self):
+        cache = LRUCache(max_bytes=100)
+        cache.put("a", "x", size=60)
+        cache.put("a", "y", size=10)
+
+        assert cache.nbytes == 10
+
+    def test_value_larger_than_max_bytes_is_not_stored(self):
+        cache = LRUCache(max_bytes=100)
+        cache.put("a", "x", size=10)
+        cache.put("big", "y", size=101)
+
+        assert cache.get("big") is None
+        assert cache.get("a") == "x"
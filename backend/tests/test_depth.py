@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 import numpy as np
-from PIL import Image
 
-from comic_engine.core.depth import estimate_depth
+from comic_engine.core.depth import (
+    estimate_depth,
+    normalise_depth,
+    normalise_depth_uint8,
+)
 
 
 class TestEstimateDepth:
@@ -18,7 +21,7 @@ class TestEstimateDepth:
 
     def test_output_shape_matches_image(self, test_image, mock_model):
         result = estimate_depth(test_image, mock_model)
-        w, h = test_image.size
+        h, w = test_image.shape[:2]
 
         assert result.shape == (h, w)
 
@@ -26,24 +29,67 @@ class TestEstimateDepth:
         """When the model returns a constant depth, normalisation should return zeros."""
 
         class UniformModel:
-            def predict(self, image: Image.Image) -> np.ndarray:
-                w, h = image.size
+            def predict(self, image: np.ndarray) -> np.ndarray:
+                h, w = image.shape[:2]
                 return np.full((h, w), 5.0, dtype=np.float32)
 
         result = estimate_depth(test_image, UniformModel())
 
-        assert result.shape == (test_image.size[1], test_image.size[0])
+        assert result.shape == test_image.shape[:2]
         assert np.all(result == 0.0)
 
     def test_normalisation_with_known_values(self):
         """Verify exact normalisation arithmetic."""
 
         class KnownModel:
-            def predict(self, image: Image.Image) -> np.ndarray:
+            def predict(self, image: np.ndarray) -> np.ndarray:
                 return np.array([[2.0, 4.0], [6.0, 8.0]], dtype=np.float32)
 
-        img = Image.new("RGB", (2, 2))
+        img = np.zeros((2, 2, 3), dtype=np.uint8)
         result = estimate_depth(img, KnownModel())
 
         expected = np.array([[0.0, 1 / 3], [2 / 3, 1.0]], dtype=np.float32)
         np.testing.assert_allclose(result, expected, atol=1e-6)
+
+    def test_float64_input_spans_exactly_zero_to_one(self):
+        raw = np.random.default_rng(0).uniform(-5.0, 32.0, size=(97, 101))
+
+        result = normalise_depth(raw)
+
+        assert result.dtype == np.float32
+        assert result.min() == 0.0
+        assert result.max() == 1.0
+
+
+class TestNormaliseDepthUint8:
+    def test_output_dtype_and_range(self):
+        raw = np.array([[2.0, 4.0], [6.0, 8.0]], dtype=np.float32)
+
+        result = normalise_depth_uint8(raw)
+
+        assert result.dtype == np.uint8
+        assert result.min() == 0
+        assert result.max() == 255
+
+    def test_matches_float_path(self):
+        raw = np.random.default_rng(0).normal(10.0, 3.0, size=(48, 64))
+
+        result = normalise_depth_uint8(raw)
+        expected = (normalise_depth(raw) * 255).clip(0, 255).astype(np.uint8)
+
+        assert result.shape == raw.shape
+        np.testing.assert_array_equal(result, expected)
+
+    def test_maximum_always_maps_to_255(self):
+        rng = np.random.default_rng(0)
+        for _ in range(2000):
+            raw = rng.uniform(-100.0, 100.0, size=(2, 2)).astype(np.float32)
+            assert normalise_depth_uint8(raw).max() == 255
+
+    def test_uniform_input_returns_zeros(self):
+        raw = np.full((4, 5), 3.0, dtype=np.float32)
+
+        result = normalise_depth_uint8(raw)
+
+        assert result.dtype == np.uint8
+        assert np.all(result == 0)
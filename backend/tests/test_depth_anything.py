@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import os
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
@@ -12,6 +13,7 @@ from PIL import Image
 torch = pytest.importorskip("torch")
 
 from comic_engine.adapters.depth_anything import DepthAnythingV2Adapter  # noqa: E402
+from comic_engine.core.depth import normalise_depth_uint8  # noqa: E402
 from comic_engine.core.ports import DepthModelPort  # noqa: E402
 
 
@@ -25,6 +27,35 @@ def test_detect_device_returns_torch_device():
     assert isinstance(device, torch.device)
 
 
+def test_detect_device_is_cached():
+    assert DepthAnythingV2Adapter._detect_device() is (
+        DepthAnythingV2Adapter._detect_device()
+    )
+
+
+def _processor_config(**overrides) -> SimpleNamespace:
+    """Stand-in for the Depth Anything V2 preprocessor configuration."""
+    config = dict(
+        size={"height": 518, "width": 518},
+        keep_aspect_ratio=True,
+        ensure_multiple_of=14,
+        image_mean=[0.485, 0.456, 0.406],
+        image_std=[0.229, 0.224, 0.225],
+    )
+    config.update(overrides)
+    return SimpleNamespace(**config)
+
+
+def _mock_model() -> MagicMock:
+    """Model whose predicted depth is the first input channel."""
+    model_instance = MagicMock()
+    model_instance.side_effect = lambda pixel_values: SimpleNamespace(
+        predicted_depth=pixel_values[:, 0]
+    )
+    model_instance.to.return_value = model_instance
+    return model_instance
+
+
 @patch(
     "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
 )
@@ -34,26 +65,393 @@ def test_detect_device_returns_torch_device():
 def test_predict_returns_array(mock_processor_cls, mock_model_cls):
     width, height = 32, 24
 
-    # Processor: return a namespace whose .to() yields a real dict of tensors
-    processor_instance = MagicMock()
-    processor_instance.side_effect = lambda **kwargs: SimpleNamespace(
-        to=lambda device: {"pixel_values": torch.randn(1, 3, height, width)},
-    )
-    mock_processor_cls.from_pretrained.return_value = processor_instance
-
-    # Model: return a real depth tensor so torch.nn.functional.interpolate works
-    depth_tensor = torch.randn(1, height, width)
-    model_instance = MagicMock()
-    model_instance.return_value = SimpleNamespace(predicted_depth=depth_tensor)
-    model_instance.eval.return_value = None
-    model_instance.to.return_value = model_instance
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    model_instance = _mock_model()
     mock_model_cls.from_pretrained.return_value = model_instance
 
     adapter = DepthAnythingV2Adapter()
-    image = Image.new("RGB", (width, height))
+    image = np.zeros((height, width, 3), dtype=np.uint8)
     result = adapter.predict(image)
 
     assert isinstance(result, np.ndarray)
     assert result.shape == (height, width)
+    assert result.dtype == np.float32
+    model_instance.to.assert_any_call(memory_format=torch.channels_last)
     mock_processor_cls.from_pretrained.assert_called_once()
     mock_model_cls.from_pretrained.assert_called_once()
+    # Input is resized to the processor's target, keeping aspect ratio
+    assert model_instance.call_args.kwargs["pixel_values"].shape == (1, 3, 392, 518)
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_predict_batch_groups_inputs_by_shape(mock_processor_cls, mock_model_cls):
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    model_instance = _mock_model()
+    mock_model_cls.from_pretrained.return_value = model_instance
+
+    adapter = DepthAnythingV2Adapter()
+    images = [
+        np.zeros((24, 32, 3), dtype=np.uint8),
+        np.zeros((16, 16, 3), dtype=np.uint8),
+        np.zeros((48, 64, 3), dtype=np.uint8),
+    ]
+    results = adapter.predict_batch(images)
+
+    assert [r.shape for r in results] == [(24, 32), (16, 16), (48, 64)]
+    batch_sizes = [
+        c.kwargs["pixel_values"].shape[0] for c in model_instance.call_args_list
+    ]
+    assert sorted(batch_sizes) == [1, 2]
+
+
+def test_preprocess_matches_hf_processor():
+    transformers = pytest.importorskip("transformers")
+    processor = transformers.DPTImageProcessor(
+        do_resize=True,
+        size={"height": 518, "width": 518},
+        keep_aspect_ratio=True,
+        ensure_multiple_of=14,
+        resample=Image.BICUBIC,
+        do_rescale=True,
+        do_normalize=True,
+        image_mean=[0.485, 0.456, 0.406],
+        image_std=[0.229, 0.224, 0.225],
+    )
+    adapter = DepthAnythingV2Adapter()
+    adapter._processor = processor
+    adapter._device = torch.device("cpu")
+    adapter._build_preprocess()
+
+    rng = np.random.default_rng(0)
+    smooth = rng.random((6, 8, 3)) * 255
+    image = Image.fromarray(smooth.astype(np.uint8)).resize((160, 120), Image.BICUBIC)
+
+    expected = processor(images=image, return_tensors="pt")["pixel_values"]
+    actual = adapter._preprocess(np.array(image))
+
+    assert actual.shape == expected.shape
+    torch.testing.assert_close(actual, expected, atol=0.05, rtol=0)
+
+
+@patch("comic_engine.adapters.depth_anything.torch.compile")
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_depth_compile_env_compiles_and_warms_model(
+    mock_processor_cls, mock_model_cls, mock_compile, monkeypatch, tmp_path
+):
+    # The adapter sets TORCHINDUCTOR_CACHE_DIR; keep it out of the real env
+    monkeypatch.setattr(os, "environ", dict(os.environ))
+    monkeypatch.delenv("TORCHINDUCTOR_CACHE_DIR", raising=False)
+    monkeypatch.setenv("DEPTH_COMPILE", "reduce-overhead")
+    monkeypatch.setenv("HF_HOME", str(tmp_path))
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    model_instance = _mock_model()
+    mock_model_cls.from_pretrained.return_value = model_instance
+    compiled = _mock_model()
+    mock_compile.return_value = compiled
+
+    adapter = DepthAnythingV2Adapter()
+    adapter.predict(np.zeros((24, 32, 3), dtype=np.uint8))
+
+    mock_compile.assert_called_once_with(model_instance, mode="reduce-overhead")
+    # Two warm-up forwards per warmed shape at load time, then the request
+    warmed = [c.kwargs["pixel_values"].shape[2:] for c in compiled.call_args_list]
+    assert warmed[:-1:2] == [(518, 518), (392, 518), (518, 392)]
+    assert compiled.call_count == 7
+    # A 3:4 image reuses a warmed shape
+    assert warmed[-1] == (392, 518)
+    assert model_instance.call_count == 0
+    assert os.environ["TORCHINDUCTOR_CACHE_DIR"] == str(tmp_path / "torchinductor")
+
+
+@patch("comic_engine.adapters.depth_anything.torch.compile")
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_unrecognised_compile_mode_falls_back_to_eager(
+    mock_processor_cls, mock_model_cls, mock_compile, monkeypatch
+):
+    monkeypatch.setenv("DEPTH_COMPILE", "1")
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    model_instance = _mock_model()
+    mock_model_cls.from_pretrained.return_value = model_instance
+    # torch.compile validates the mode eagerly
+    mock_compile.side_effect = RuntimeError("Unrecognized mode=1")
+
+    adapter = DepthAnythingV2Adapter()
+    result = adapter.predict(np.zeros((24, 32, 3), dtype=np.uint8))
+
+    assert result.shape == (24, 32)
+    assert model_instance.call_count == 1
+
+
+@patch("comic_engine.adapters.depth_anything.torch.compile")
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_failed_compile_falls_back_to_eager(
+    mock_processor_cls, mock_model_cls, mock_compile, monkeypatch
+):
+    monkeypatch.setenv("DEPTH_COMPILE", "default")
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    model_instance = _mock_model()
+    mock_model_cls.from_pretrained.return_value = model_instance
+    mock_compile.return_value = MagicMock(side_effect=RuntimeError("no compiler"))
+
+    adapter = DepthAnythingV2Adapter()
+    result = adapter.predict(np.zeros((24, 32, 3), dtype=np.uint8))
+
+    assert result.shape == (24, 32)
+    assert model_instance.call_count == 1
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_predict_batch_uint8_matches_core_normalisation(
+    mock_processor_cls, mock_model_cls
+):
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    mock_model_cls.from_pretrained.return_value = _mock_model()
+
+    adapter = DepthAnythingV2Adapter()
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (24, 32, 3), dtype=np.uint8)]
+    raw = adapter.predict_batch(images)
+    result = adapter.predict_batch_uint8(images)
+
+    assert result[0].dtype == np.uint8
+    expected = normalise_depth_uint8(raw[0])
+    np.testing.assert_array_equal(result[0], expected)
+    assert result[0].min() == 0 and result[0].max() == 255
+
+
+def test_to_uint8_maps_maximum_to_255():
+    generator = torch.Generator().manual_seed(0)
+    for _ in range(2000):
+        depth = torch.rand((2, 2), generator=generator) * 200 - 100
+        assert DepthAnythingV2Adapter._to_uint8(depth).max() == 255
+
+
+def test_to_uint8_maps_constant_depth_to_zeros():
+    result = DepthAnythingV2Adapter._to_uint8(torch.full((3, 4), 2.5))
+
+    assert result.dtype == torch.uint8
+    assert torch.all(result == 0)
+
+
+def _ssim(a: np.ndarray, b: np.ndarray, window: int = 7) -> float:
+    """Mean structural similarity of two uint8 images (box window)."""
+    x = torch.from_numpy(a).double()[None, None]
+    y = torch.from_numpy(b).double()[None, None]
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def mean(t):
+        return torch.nn.functional.avg_pool2d(t, window, stride=1)
+
+    mu_x, mu_y = mean(x), mean(y)
+    var_x = mean(x * x) - mu_x**2
+    var_y = mean(y * y) - mu_y**2
+    cov = mean(x * y) - mu_x * mu_y
+    ssim = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / (
+        (mu_x**2 + mu_y**2 + c1) * (var_x + var_y + c2)
+    )
+    return ssim.mean().item()
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_bilinear_upsample_matches_bicubic_quality(
+    mock_processor_cls, mock_model_cls, monkeypatch
+):
+    # A small processor size makes the final upsample ratio large
+    mock_processor_cls.from_pretrained.return_value = _processor_config(
+        size={"height": 70, "width": 70}
+    )
+    mock_model_cls.from_pretrained.return_value = _mock_model()
+
+    y, x = np.mgrid[0:480, 0:640]
+    smooth = 127 + 60 * np.sin(x / 45.0) + 60 * np.cos(y / 30.0)
+    image = np.repeat(smooth.astype(np.uint8)[:, :, np.newaxis], 3, axis=2)
+
+    outputs = {}
+    for mode in DepthAnythingV2Adapter.INTERP_MODES:
+        monkeypatch.setenv("DEPTH_INTERP", mode)
+        outputs[mode] = DepthAnythingV2Adapter().predict_batch_uint8([image])[0]
+
+    assert outputs["bilinear"].shape == (480, 640)
+    assert _ssim(outputs["bilinear"], outputs["bicubic"]) > 0.99
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_unknown_interp_mode_is_rejected(
+    mock_processor_cls, mock_model_cls, monkeypatch
+):
+    monkeypatch.setenv("DEPTH_INTERP", "lanczos")
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    mock_model_cls.from_pretrained.return_value = _mock_model()
+
+    with pytest.raises(ValueError, match="DEPTH_INTERP"):
+        DepthAnythingV2Adapter().predict(np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_cuda_graphs_disabled_off_cuda(mock_processor_cls, mock_model_cls):
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    mock_model_cls.from_pretrained.return_value = _mock_model()
+
+    adapter = DepthAnythingV2Adapter()
+    with patch.object(
+        DepthAnythingV2Adapter, "_detect_device", return_value=torch.device("cpu")
+    ):
+        adapter.predict(np.zeros((24, 32, 3), dtype=np.uint8))
+
+    assert adapter._use_cuda_graphs is False
+    assert adapter._graphs == {}
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_graph_replay_is_cached_per_input_shape(
+    mock_processor_cls, mock_model_cls, monkeypatch
+):
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    model_instance = _mock_model()
+    mock_model_cls.from_pretrained.return_value = model_instance
+
+    adapter = DepthAnythingV2Adapter()
+    adapter._load()
+    adapter._use_cuda_graphs = True
+    monkeypatch.setattr(DepthAnythingV2Adapter, "MAX_CUDA_GRAPHS", 2)
+
+    captured = []
+
+    def fake_capture(batch):
+        # Stand-in for a CUDA graph: replay recomputes into static_out
+        static_in = batch.clone()
+        static_out = adapter._forward(adapter._model, static_in)
+        graph = MagicMock()
+        graph.replay.side_effect = lambda: static_out.copy_(
+            adapter._forward(adapter._model, static_in)
+        )
+        captured.append(tuple(batch.shape))
+        return graph, static_in, static_out
+
+    monkeypatch.setattr(adapter, "_capture", fake_capture)
+
+    shapes = [(24, 32), (24, 32), (16, 16), (48, 16)]
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (*shape, 3), dtype=np.uint8) for shape in shapes]
+    graphed = [adapter.predict(image) for image in images]
+
+    adapter._use_cuda_graphs = False
+    eager = [adapter.predict(image) for image in images]
+
+    # Two shapes captured; the third exceeds MAX_CUDA_GRAPHS and runs eagerly
+    assert len(captured) == 2
+    for g, e in zip(graphed, eager):
+        np.testing.assert_allclose(g, e, atol=1e-5)
+
+
+@patch(
+    "comic_engine.adapters.depth_anything.AutoModelForDepthEstimation",
+)
+@patch(
+    "comic_engine.adapters.depth_anything.AutoImageProcessor",
+)
+def test_cuda_graphs_serialise_whole_predictions(
+    mock_processor_cls, mock_model_cls, monkeypatch
+):
+    mock_processor_cls.from_pretrained.return_value = _processor_config()
+    mock_model_cls.from_pretrained.return_value = _mock_model()
+
+    adapter = DepthAnythingV2Adapter()
+    adapter._load()
+    adapter._use_cuda_graphs = True
+    # Eager stand-in for graph replay: this test is only about the lock
+    monkeypatch.setattr(
+        adapter, "_run", lambda batch: adapter._forward(adapter._model, batch)
+    )
+    lock_held = []
+    preprocess = adapter._preprocess
+
+    def recording_preprocess(image):
+        # Uploads and resizes must not overlap another thread's capture
+        lock_held.append(adapter._device_lock.locked())
+        return preprocess(image)
+
+    monkeypatch.setattr(adapter, "_preprocess", recording_preprocess)
+
+    image = np.zeros((24, 32, 3), dtype=np.uint8)
+    adapter.predict_batch([image])
+    adapter.predict_batch_uint8([image])
+
+    assert lock_held == [True, True]
+    assert not adapter._device_lock.locked()
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs CUDA")
+def test_cuda_graph_replay_matches_eager():
+    class TinyDepth(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.conv = torch.nn.Conv2d(3, 1, 3, padding=1)
+
+        def forward(self, pixel_values):
+            return SimpleNamespace(predicted_depth=self.conv(pixel_values)[:, 0])
+
+    adapter = DepthAnythingV2Adapter()
+    adapter._model = TinyDepth().cuda().half().eval()
+    adapter._device = torch.device("cuda")
+    adapter._autocast_args = {
+        "device_type": "cuda",
+        "dtype": torch.float16,
+        "enabled": True,
+        "cache_enabled": False,
+    }
+    adapter._use_cuda_graphs = True
+    adapter._graph_pool = torch.cuda.graph_pool_handle()
+
+    batch = torch.randn(1, 3, 28, 42, device="cuda", dtype=torch.float16)
+    first = adapter._run(batch)
+    second = adapter._run(batch * 2)
+
+    torch.testing.assert_close(first, adapter._forward(adapter._model, batch))
+    torch.testing.assert_close(second, adapter._forward(adapter._model, batch * 2))
+    assert len(adapter._graphs) == 1
@@ -3,12 +3,32 @@
 from __future__ import annotations
 
 import io
+import struct
+import warnings
+import zlib
 
 import numpy as np
 import pytest
 from PIL import Image
 
-from comic_engine.core.image_utils import decode_upload, depth_to_png
+from comic_engine.core import image_utils
+from comic_engine.core.image_utils import (
+    ImageTooLargeError,
+    decode_upload,
+    depth_to_png,
+    encode_depth_uint8,
+)
+
+
+def _png_header(width: int, height: int) -> bytes:
+    """A PNG without pixel data: enough for PIL to read the size."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", b"")
 
 
 def _image_to_png_bytes(img: Image.Image) -> bytes:
@@ -24,8 +44,9 @@ class TestDecodeUpload:
 
         result = decode_upload(raw)
 
-        assert result.mode == "RGB"
-        assert result.size == (32, 32)
+        assert result.dtype == np.uint8
+        assert result.shape == (32, 32, 3)
+        np.testing.assert_array_equal(result[0, 0], (255, 0, 0))
 
     def test_converts_rgba_to_rgb(self):
         img = Image.new("RGBA", (16, 16), color=(0, 255, 0, 128))
@@ -33,12 +54,129 @@ class TestDecodeUpload:
 
         result = decode_upload(raw)
 
-        assert result.mode == "RGB"
+        assert result.shape == (16, 16, 3)
 
     def test_invalid_bytes_raises_value_error(self):
         with pytest.raises(ValueError, match="Invalid image data"):
             decode_upload(b"not-an-image")
 
+    def test_truncated_png_raises_value_error(self):
+        raw = _image_to_png_bytes(Image.new("RGB", (32, 32)))
+
+        with pytest.raises(ValueError, match="Invalid image data"):
+            decode_upload(raw[: len(raw) // 2])
+
+    @pytest.mark.parametrize("fraction", [0.5, 0.9, 0.99])
+    def test_truncated_jpeg_raises_value_error(self, fraction):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 255, (256, 256, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, format="JPEG")
+        raw = buf.getvalue()
+
+        with pytest.raises(ValueError, match="Invalid image data"):
+            decode_upload(raw[: int(len(raw) * fraction)])
+
+    def test_jpeg_with_trailing_padding_decodes(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (16, 16), color=(10, 20, 30)).save(buf, format="JPEG")
+
+        result = decode_upload(buf.getvalue() + b"\x00" * 8)
+
+        assert result.shape == (16, 16, 3)
+
+
+class TestDecodeUploadLimits:
+    def test_too_many_bytes_raises(self, monkeypatch):
+        raw = _image_to_png_bytes(Image.new("RGB", (32, 32)))
+        monkeypatch.setattr(image_utils, "MAX_BYTES", len(raw) - 1)
+
+        with pytest.raises(ImageTooLargeError, match="MB limit"):
+            decode_upload(raw)
+
+    def test_too_many_pixels_raises(self, monkeypatch):
+        raw = _image_to_png_bytes(Image.new("RGB", (32, 32)))
+        monkeypatch.setattr(image_utils, "MAX_DECODE_PIXELS", 32 * 32 - 1)
+
+        with pytest.raises(ImageTooLargeError, match="32x32"):
+            decode_upload(raw)
+
+    @pytest.mark.parametrize("side", [8192 + 1, 10_000, 20_000])
+    def test_huge_header_raises_too_large(self, side):
+        # Header-only PNG: 10000^2 trips PIL's bomb warning, 20000^2 its error
+        raw = _png_header(side, side)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            with pytest.raises(ImageTooLargeError, match="pixel limit"):
+                decode_upload(raw)
+
+    def test_limit_errors_are_value_errors(self):
+        assert issubclass(ImageTooLargeError, ValueError)
+
+    @pytest.mark.parametrize("fmt", ["PNG", "JPEG"])
+    def test_large_image_is_downscaled_to_fit(self, fmt, monkeypatch):
+        monkeypatch.setattr(image_utils, "MAX_SIDE", 16)
+        monkeypatch.setattr(image_utils, "MAX_PIXELS", 16 * 16)
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 32), color=(10, 20, 30)).save(buf, format=fmt)
+
+        result = decode_upload(buf.getvalue())
+
+        assert result.shape == (8, 16, 3)
+        np.testing.assert_allclose(result[4, 8], (10, 20, 30), atol=3)
+
+    def test_image_at_limit_is_not_resized(self, monkeypatch):
+        monkeypatch.setattr(image_utils, "MAX_SIDE", 16)
+        monkeypatch.setattr(image_utils, "MAX_PIXELS", 32 * 8)
+        raw = _image_to_png_bytes(Image.new("RGB", (32, 8)))
+
+        assert decode_upload(raw).shape == (8, 32, 3)
+
+
+class TestDecodeUploadFastPath:
+    """imagecodecs must decode exactly what the PIL fallback would."""
+
+    @pytest.fixture(autouse=True)
+    def _require_imagecodecs(self):
+        pytest.importorskip("imagecodecs")
+
+    @pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA", "P", "1"])
+    def test_png_matches_pil(self, mode, monkeypatch):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 255, (12, 10, 3), dtype=np.uint8)
+        raw = _image_to_png_bytes(Image.fromarray(pixels).convert(mode))
+
+        fast = decode_upload(raw)
+        monkeypatch.setattr(image_utils, "imagecodecs", None)
+        slow = decode_upload(raw)
+
+        assert fast.shape == (12, 10, 3)
+        np.testing.assert_array_equal(fast, slow)
+
+    def test_jpeg_matches_pil(self, monkeypatch):
+        img = Image.new("RGB", (40, 30), color=(200, 100, 50))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG")
+        raw = buf.getvalue()
+
+        fast = decode_upload(raw)
+        monkeypatch.setattr(image_utils, "imagecodecs", None)
+        slow = decode_upload(raw)
+
+        assert fast.shape == (30, 40, 3)
+        np.testing.assert_allclose(fast, slow, atol=2)
+
+    def test_cmyk_jpeg_falls_back_to_pil(self):
+        img = Image.new("CMYK", (8, 8), color=(0, 255, 255, 0))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG")
+
+        result = decode_upload(buf.getvalue())
+
+        assert result.shape == (8, 8, 3)
+        np.testing.assert_allclose(result[0, 0], (255, 0, 0), atol=8)
+
 
 class TestDepthToPng:
     def test_returns_valid_png(self, sample_depth_array):
@@ -55,3 +193,34 @@ class TestDepthToPng:
         recovered = np.array(img, dtype=np.float32) / 255.0
 
         np.testing.assert_allclose(recovered, sample_depth_array, atol=1 / 255 + 1e-6)
+
+
+class TestEncodeDepthUint8:
+    def test_png_roundtrip_exact(self):
+        depth = np.arange(48, dtype=np.uint8).reshape(6, 8) * 5
+
+        png_bytes = encode_depth_uint8(depth)
+        img = Image.open(io.BytesIO(png_bytes))
+
+        assert img.format == "PNG"
+        assert img.mode == "L"
+        np.testing.assert_array_equal(np.array(img), depth)
+
+    def test_non_contiguous_input(self):
+        depth = np.arange(48, dtype=np.uint8).reshape(6, 8)[:, ::2]
+
+        img = Image.open(io.BytesIO(encode_depth_uint8(depth)))
+
+        np.testing.assert_array_equal(np.array(img), depth)
+
+    @pytest.mark.parametrize("fmt", sorted(image_utils.DEPTH_FORMATS))
+    def test_roundtrip_is_close(self, fmt):
+        y, x = np.mgrid[0:64, 0:48]
+        depth = ((y * 2 + x) % 256).astype(np.uint8)
+
+        img = Image.open(io.BytesIO(encode_depth_uint8(depth, fmt)))
+
+        assert img.format == fmt.upper()
+        assert img.size == (48, 64)
+        decoded = np.asarray(img.convert("L"), dtype=np.int16)
+        assert np.abs(decoded - depth).mean() < 2
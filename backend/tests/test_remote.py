@@ -0,0 +1,175 @@
+"""Tests for the inference-process adapter and server loop."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import pytest
+
+from comic_engine.adapters import remote as remote_module
+from comic_engine.adapters.remote import RemoteDepthModel, serve
+from comic_engine.core.ports import DepthModelPort
+
+AUTHKEY = b"test-authkey"
+
+
+class _MeanModel:
+    """Batch model returning each image's mean over channels, plus a call log."""
+
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def predict(self, image):
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images):
+        self.gate.wait()
+        self.batch_sizes.append(len(images))
+        return [image.mean(axis=2, dtype=np.float32) for image in images]
+
+    def predict_batch_uint8(self, images):
+        return [d.astype(np.uint8) for d in self.predict_batch(images)]
+
+
+@pytest.fixture()
+def served(tmp_path, monkeypatch):
+    """Serve a ``_MeanModel`` on a Unix socket from a background thread."""
+    # Client and server share this process's resource tracker here, so the
+    # client's unlink already unregisters every block.
+    monkeypatch.setattr(remote_module, "_untrack", lambda shm: None)
+    model = _MeanModel()
+    address = str(tmp_path / "inference.sock")
+    listener = Listener(address, family="AF_UNIX", authkey=AUTHKEY)
+    threading.Thread(target=serve, args=(model, listener), daemon=True).start()
+    yield model, address
+    listener.close()
+
+
+def _image(value: int, h: int = 8, w: int = 6) -> np.ndarray:
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+def test_remote_model_satisfies_protocol():
+    assert isinstance(RemoteDepthModel("/nonexistent", AUTHKEY), DepthModelPort)
+
+
+def test_round_trip_matches_local_model(served):
+    model, address = served
+    remote = RemoteDepthModel(address, AUTHKEY)
+    images = [_image(10), _image(200, h=5, w=7)]
+
+    expected = model.predict_batch(images)
+    for got, want in zip(remote.predict_batch(images), expected):
+        np.testing.assert_array_equal(got, want)
+    uint8 = remote.predict_batch_uint8(images)
+    assert [d.dtype for d in uint8] == [np.uint8, np.uint8]
+    assert uint8[1].shape == (5, 7)
+    assert remote.predict(_image(42)).shape == (8, 6)
+
+
+def test_requests_from_several_clients_share_a_batch(served):
+    model, address = served
+    model.gate.clear()  # hold the first batch so the others queue up
+
+    clients = [RemoteDepthModel(address, AUTHKEY) for _ in range(4)]
+    with ThreadPoolExecutor(len(clients)) as pool:
+        futures = [
+            pool.submit(client.predict, _image(i)) for i, client in enumerate(clients)
+        ]
+        time.sleep(0.5)
+        model.gate.set()
+        results = [f.result(timeout=5) for f in futures]
+
+    assert [int(r[0, 0]) for r in results] == [0, 1, 2, 3]
+    assert sum(model.batch_sizes) == 4
+    assert len(model.batch_sizes) < 4
+
+
+def test_model_error_is_raised_in_client(served):
+    model, address = served
+    remote = RemoteDepthModel(address, AUTHKEY)
+    model.predict_batch = lambda images: 1 / 0
+
+    with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+        remote.predict(_image(1))
+
+    del model.predict_batch
+    assert remote.predict(_image(1)).shape == (8, 6)
+
+
+def test_shared_memory_blocks_are_released(served):
+    _, address = served
+    remote = RemoteDepthModel(address, AUTHKEY)
+    before = set(os.listdir("/dev/shm"))
+
+    remote.predict_batch([_image(1), _image(2)])
+
+    assert set(os.listdir("/dev/shm")) <= before
+
+
+def test_connect_gives_up_after_timeout(tmp_path):
+    remote = RemoteDepthModel(
+        str(tmp_path / "missing.sock"), AUTHKEY, connect_timeout=0
+    )
+    with pytest.raises(FileNotFoundError):
+        remote.predict(_image(1))
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        ("predict_batch", [("no-such-block", (8, 6, 3), "|u1")]),
+        ("predict_batch", "not a list of refs"),
+        ("predict_batch",),
+        ("__class__", []),
+    ],
+)
+def test_malformed_request_gets_error_reply(served, request_):
+    _, address = served
+    with Client(address, family="AF_UNIX", authkey=AUTHKEY) as conn:
+        conn.send(request_)
+        status, _ = conn.recv()
+        assert status == "error"
+
+        # The connection keeps serving
+        conn.send(("predict_batch", []))
+        assert conn.recv() == ("ok", [])
+
+
+def test_oversized_shape_gets_error_reply(served):
+    _, address = served
+    with Client(address, family="AF_UNIX", authkey=AUTHKEY) as conn:
+        shm, (name, _, dtype) = remote_module._put_array(_image(1))
+        try:
+            conn.send(("predict_batch", [(name, (1000, 1000, 3), dtype)]))
+            status, payload = conn.recv()
+        finally:
+            shm.close()
+            shm.unlink()
+    assert status == "error"
+    assert "buffer is too small" in payload
+
+
+def test_wrong_authkey_is_rejected(served):
+    _, address = served
+    with pytest.raises(AuthenticationError):
+        Client(address, family="AF_UNIX", authkey=b"wrong")
+
+    assert RemoteDepthModel(address, AUTHKEY).predict(_image(1)).shape == (8, 6)
+
+
+def test_inference_authkey_requires_env(monkeypatch):
+    monkeypatch.delenv("DEPTH_INFERENCE_AUTHKEY", raising=False)
+    with pytest.raises(RuntimeError, match="DEPTH_INFERENCE_AUTHKEY"):
+        remote_module.inference_authkey()
+
+    monkeypatch.setenv("DEPTH_INFERENCE_AUTHKEY", "secret")
+    assert remote_module.inference_authkey() == b"secret"